@@ -1,7 +1,7 @@
 
 import logging
 
-from rememo.memoizer import Memoizer
+from rememo.memoizer import Memoizer, make_hashable, hashable_converter, pickle_hashable, digest_hashable
 from rememo.templates import TrackingMemoizer, SharedMemoizer
 
 logger = logging.getLogger(__name__)
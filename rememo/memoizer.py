@@ -1,25 +1,185 @@
 
 import pickle
+import hashlib
 import logging
-from typing import Any, Hashable, Optional
+import threading
+import weakref
+from typing import Any, Hashable, Optional, Tuple
 from functools import wraps
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+_MISS = object()
+
+
+class _KwargsMark:
+	'''
+	Separates args from kwargs in fast_key keys. Compared by identity, so no
+		argument can be mistaken for it, and pickled by name, so it is the same
+		object again on a SharedMemoizer's cache server.
+	'''
+
+	__slots__ = ()
+
+	def __reduce__(self) -> str:
+		return '_KWARGS_MARK'
+
+	def __repr__(self) -> str:
+		return '<rememo kwargs>'
+
+
+_KWARGS_MARK = _KwargsMark()
+
+
+def pickle_hashable(obj: Any) -> bytes:
+	'''
+	Converts an object to a hashable bytes object with pickle.
+	The default fallback for make_hashable.
+	'''
+	return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _convert_hashable(obj: Any, convert: callable, fallback: callable) -> Hashable:
+	'''
+	Implements make_hashable and the converters from hashable_converter.
+
+	Args:
+		obj (Any): The object to convert
+		convert (callable): Converts items of containers, recursively
+		fallback (callable): Converts objects of any other type
+
+	Returns:
+		Hashable: A hashable form of obj
+	'''
+
+	if isinstance(obj, (str, bytes, int, float, complex, type(None))):
+		return obj
+	if isinstance(obj, tuple):
+		return tuple(map(convert, obj))
+	if isinstance(obj, list):
+		return (list, tuple(map(convert, obj)))
+	if isinstance(obj, dict):
+		return (dict, frozenset(zip(obj.keys(), map(convert, obj.values()))))
+	if isinstance(obj, (set, frozenset)):
+		return (type(obj), frozenset(map(convert, obj)))
+	return fallback(obj)
+
+
+def make_hashable(obj: Any) -> Hashable:
+	'''
+	Converts an object to a small hashable form for use as a cache key.
+	Strings, bytes, numbers and None are returned as-is. Tuples, lists, sets
+	and dicts are converted recursively to tuples and frozensets, tagged with
+	their type where needed so that e.g. [1] and (1,) are cached separately.
+	Dicts become frozensets of items, so key order never affects the result.
+	Anything else is passed to pickle_hashable; see hashable_converter to use
+	a different fallback.
+
+	Args:
+		obj (Any): The object to convert
+
+	Returns:
+		Hashable: A hashable form of obj
+	'''
+
+	return _convert_hashable(obj, make_hashable, pickle_hashable)
+
+
+def hashable_converter(fallback: callable = pickle_hashable) -> callable:
+	'''
+	Builds a make_hashable function that passes unrecognised objects to
+	fallback. To use a different fallback with a Memoizer, pass e.g.
+		make_hashable_func=hashable_converter(repr)
+	Note that, unlike make_hashable itself, a converter with a custom
+	fallback is a local function, so Memoizers using it cannot be pickled.
+
+	Args:
+		fallback (callable, optional): Converts objects of any type that
+			make_hashable does not handle itself. Defaults to pickle_hashable.
+
+	Returns:
+		callable: A make_hashable function
+	'''
+
+	if fallback is pickle_hashable:
+		return make_hashable
+
+	def converter(obj: Any) -> Hashable:
+		'''
+		Like make_hashable, but passes unrecognised objects to fallback.
+		'''
+
+		return _convert_hashable(obj, converter, fallback)
+
+	return converter
+
+
+def digest_hashable(obj: Any) -> bytes:
+	'''
+	Converts an object to a 16-byte blake2b digest of its pickle.
+	Useful as a make_hashable_func for functions with large arguments, so that
+		each cache key is 16 bytes rather than a full copy of the arguments:
+		Memoizer(make_hashable_func=digest_hashable)
+	Hashable args still use fast_key unless it is disabled.
+
+	Two different arguments with the same digest would share a result. At 128
+		bits this is vanishingly unlikely, but not impossible.
+	Equal arguments that pickle differently, such as sets built in a different
+		order, get different keys; they are cached separately, not mixed up.
+	'''
+	return hashlib.blake2b(
+		pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL),
+		digest_size=16
+	).digest()
+
 
 class Memoizer:
 	'''
 	Class to facilitate memoization of function returns.
 
 	Attributes:
-		functions (
+		results_cache (
 			Dict[
 				callable: Dict[
-					Tuple[frozenset, frozenset]: Object
+					Hashable: Object
 				]
 			]
 		)
-		A dictionary of functions: dictionary of args: results
+		A dictionary of functions: dictionary of processed params: results.
+			This is deliberately nested by function rather than keyed on
+			(function, params): it lets remove_from_cache drop every result
+			for a function in one step, and lets SharedMemoizer ship a single
+			function's results to and from its cache server.
+		If maxsize is set, each function's results are kept in an OrderedDict
+			in least- to most-recently used order.
+		results_cache may be replaced, e.g. with {} to clear it, as long as
+			weak_functions is not switched by doing so. The other options are
+			partly read when a function is memoized, so should not be changed
+			after that.
+
+	Args:
+		make_hashable_func (callable, optional): Converts (args, kwargs) to a
+			hashable cache key when fast_key does not apply. Defaults to
+			make_hashable.
+		sort_kwargs (bool, optional): Whether to sort kwargs before converting
+			them, so that kwarg order does not matter. Defaults to True.
+		kwarg_sort_func (callable, optional): Sorts kwarg items when
+			sort_kwargs is True. Defaults to sorted.
+		fast_key (bool, optional): Whether to use hashable args, and kwargs,
+			directly as the cache key without make_hashable_func. See
+			process_params. Defaults to True.
+		maxsize (int, optional): Maximum number of results to keep per
+			function. When exceeded, the least recently used result for that
+			function is evicted. Must not be negative. Defaults to None,
+			meaning unbounded.
+		weak_functions (bool, optional): If True, results_cache is a
+			weakref.WeakKeyDictionary, so a function's results are dropped
+			once it and its memoized wrapper are garbage collected. Useful when
+			many short-lived functions are memoized. Memoized callables must
+			then support weak references; memoized raises TypeError for those
+			that do not, e.g. instances of classes with __slots__ and no
+			__weakref__. Defaults to False.
 
 	Methods:
 		get_result: Gets the result of a function call, either
@@ -30,93 +190,269 @@ class Memoizer:
 			function to be called through get_result always.
 	'''
 
+	__slots__ = (
+		'results_cache',
+		'maxsize',
+		'make_hashable_func',
+		'sort_kwargs',
+		'kwarg_sort_func',
+		'fast_key',
+		'_pending',
+		'_pending_lock',
+		'_wrapped_funcs',
+		'__weakref__',
+	)
+
+	# Whether handle_cache_decay is overridden, so get_result can skip
+	# calling the no-op base implementation. Set per subclass below.
+	_has_decay_hook = False
+
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+		cls._has_decay_hook = cls.handle_cache_decay is not Memoizer.handle_cache_decay
+
 	def __init__(
 			self,
-			make_hashable_func: callable = pickle.dumps,
+			make_hashable_func: callable = make_hashable,
 			sort_kwargs: bool = True,
 			kwarg_sort_func: callable = sorted,
+			fast_key: bool = True,
+			maxsize: Optional[int] = None,
+			weak_functions: bool = False,
 			**kwargs
 	):
-		self.results_cache = {}
+		if maxsize is not None and maxsize < 0:
+			raise ValueError(f'maxsize must not be negative, got {maxsize}')
+		self.results_cache = weakref.WeakKeyDictionary() if weak_functions else {}
+		self.maxsize = maxsize
 
 		self.make_hashable_func = make_hashable_func
 		self.sort_kwargs = sort_kwargs
 		self.kwarg_sort_func = kwarg_sort_func
+		self.fast_key = fast_key
+
+		# Locks for calls currently being computed, by (function, params)
+		self._pending = {}
+		self._pending_lock = threading.Lock()
+		# Maps wrappers created by memoized to the function they cache results for
+		self._wrapped_funcs = weakref.WeakKeyDictionary()
+
+	def __getstate__(self) -> dict:
+		'''
+		Gets the state to pickle or copy. Locks cannot be pickled, and pending
+			calls and wrappers belong to this process, so those are left out and
+			recreated by __setstate__.
+		'''
+
+		state = dict(getattr(self, '__dict__', {}))
+		for cls in type(self).__mro__:
+			for name in getattr(cls, '__slots__', ()):
+				if name not in ('__dict__', '__weakref__') and hasattr(self, name):
+					state[name] = getattr(self, name)
+		for name in ('_pending', '_pending_lock', '_wrapped_funcs'):
+			del state[name]
+		if isinstance(self.results_cache, weakref.WeakKeyDictionary):
+			state['results_cache'] = dict(self.results_cache)
+			state['weak_functions'] = True
+		return state
+
+	def __setstate__(self, state: dict) -> None:
+		state = dict(state)
+		weak_functions = state.pop('weak_functions', False)
+		for name, value in state.items():
+			setattr(self, name, value)
+		if weak_functions:
+			self.results_cache = weakref.WeakKeyDictionary(self.results_cache)
+		self._pending = {}
+		self._pending_lock = threading.Lock()
+		self._wrapped_funcs = weakref.WeakKeyDictionary()
 
 	def process_params(
 			self, param_args: list, param_kwargs: dict
 	) -> Hashable:
 		'''
 		Converts function parameters to a hashable form.
-		By default, this uses pickle.dumps
+		By default, this uses make_hashable
 
-		See Memoizer.__init__ for processing options.
+		See the Memoizer class docstring for processing options.
 		Most importantly, if sort_kwargs is true kwargs will be sorted
 		by key first, preventing calls to the same function with different
 		kwarg ordering from being cached separately.
 
+		If fast_key is true, args and kwargs are used directly whenever they
+		are hashable, skipping make_hashable_func entirely. For calls without
+		kwargs the args tuple itself is the key, so no new objects are built.
+		kwargs are appended as a frozenset of items, so their order never
+		matters on this path.
+		As with functools.lru_cache, args that compare equal (such as 1 and 1.0)
+		then share a cache entry.
+
 		Args:
 			param_args (list): args to convert to a hashable form
 			param_kwargs (dict): kwargs to convert to a hashable form
 
 		Returns:
 			Hashable: A hashable form of the input parameters.
-				For the default method of pickle.dumps, this is a bytes object
+				For the default method of make_hashable, this is a nested tuple.
+				For the fast_key path, this is the args tuple, extended with
+				a frozenset of kwargs if there are any.
 		'''
 
-		if self.sort_kwargs is True:
+		if self.fast_key is True:
+			try:
+				if param_kwargs:
+					params = param_args + (_KWARGS_MARK, frozenset(param_kwargs.items()))
+				else:
+					params = param_args
+				hash(params)
+			except TypeError:
+				pass
+			else:
+				return params
+
+		if self.sort_kwargs is True and param_kwargs:
 			param_kwargs = dict(self.kwarg_sort_func(param_kwargs.items()))
 		return self.make_hashable_func((param_args, param_kwargs))
 
-	def _call_and_add_result(self, function: callable, *args, **kwargs) -> None:
+	def _call_and_add_result(self, function: callable, params: Hashable, *args, **kwargs) -> Any:
 		'''
 		Calls the function and adds it to the cache.
 
 		Args:
 			function (callable): The function to run.
+			params (Hashable): The processed parameters to cache the result under,
+				as returned by process_params for args and kwargs.
 			*args: Variable length argument list. Passed to function.
 			**kwargs: Arbitrary keyword arguments. Passed to function.
+
+		Returns:
+			Any: The return value of function.
 		'''
 
 		result = function(*args, **kwargs)
-		params = self.process_params(args, kwargs)
-		self.results_cache[function][params] = result
+		cache = self.results_cache[function]
+		cache[params] = result
+		self._trim_cache(function, cache)
+		return result
+
+	def _cached_result(self, function: callable, params: Hashable) -> Any:
+		'''
+		Looks up a single result in the cache.
+
+		Args:
+			function (callable): The function the result belongs to.
+			params (Hashable): The processed parameters of the result.
+
+		Returns:
+			Any: The cached result, or _MISS if there is none.
+		'''
+
+		cache = self.results_cache.get(function)
+		return _MISS if cache is None else cache.get(params, _MISS)
+
+	def _call_and_add_result_once(
+			self, function: callable, params: Hashable, *args, **kwargs
+	) -> Tuple[Any, bool]:
+		'''
+		Calls the function and adds it to the cache, unless another thread is
+			already doing so for the same params. In that case, waits for that
+			call to finish and returns its cached result instead.
+
+		Args:
+			function (callable): The function to run.
+			params (Hashable): The processed parameters to cache the result under.
+			*args: Variable length argument list. Passed to function.
+			**kwargs: Arbitrary keyword arguments. Passed to function.
+
+		Returns:
+			Tuple[Any, bool]: The return value of function, and whether it was
+				found in the cache after waiting.
+		'''
+
+		key = (function, params)
+		with self._pending_lock:
+			call_lock = self._pending.get(key)
+			if call_lock is None:
+				call_lock = self._pending[key] = threading.RLock()
+
+		try:
+			with call_lock:
+				result = self._cached_result(function, params)
+				if result is not _MISS:
+					return result, True
+				return self._call_and_add_result(function, params, *args, **kwargs), False
+		finally:
+			with self._pending_lock:
+				if self._pending.get(key) is call_lock:
+					del self._pending[key]
+
+	def _trim_cache(self, function: callable, cache: dict) -> None:
+		'''
+		Evicts the least recently used results for a function until its cache
+		is within maxsize.
+
+		Args:
+			function (callable): The function the cache belongs to.
+			cache (OrderedDict): The function's results cache.
+		'''
+
+		if self.maxsize is None:
+			return
+		while len(cache) > self.maxsize:
+			old_params, _ = cache.popitem(last=False)
+			self.handle_eviction(function, old_params)
+
+	def _resolve_function(self, function: callable) -> callable:
+		'''
+		Gets the function whose results are cached for function. This is the
+			function itself, or what it wraps if it is a memoized wrapper or
+			e.g. a bound method of one.
+
+		Args:
+			function (callable): A memoized function, or its wrapper.
+
+		Returns:
+			callable: The function results are cached under.
+		'''
+
+		try:
+			resolved = self._wrapped_funcs.get(function)
+		except TypeError:
+			# Not weakly referenceable, so it can't be a wrapper we made
+			resolved = None
+		if resolved is not None:
+			return resolved
+		if function in self.results_cache:
+			return function
+		return getattr(function, '__wrapped__', function)
 
 	def remove_from_cache(self, function: callable, *args, **kwargs) -> None:
 		'''
 		Clears a result or all results for a function from the cache.
 
 		Args:
-			function (callable): Function to clear from cache.
+			function (callable): Function to clear from cache, or its memoized wrapper.
 			params (tuple, optional): A set of parameters for that function.
 				If provided, only the results for this set of params will be cleared.
 				If omitted, the results for all param sets for that function will be cleared.
 		'''
 
-		wrapped_func = getattr(function, '__wrapped__', None)
+		function = self._resolve_function(function)
 		if args or kwargs:
 			params = self.process_params(args, kwargs)
-			if function in self.results_cache and params in self.results_cache[function]:
-				logger.debug(f'Removing unwrapped function {function} with params {params} from cache')
-				del self.results_cache[function][params]
-			elif wrapped_func in self.results_cache and params in self.results_cache[wrapped_func]:
-				logger.debug(f'Removing wrapped function {function} with params {params} from cache')
-				del self.results_cache[wrapped_func][params]
-			else:
+			cache = self.results_cache.get(function)
+			if cache is None or cache.pop(params, _MISS) is _MISS:
 				raise KeyError(f'Function {function} with params {params} not in cache')
+			logger.debug('Removed function %s with params %s from cache', function, params)
 		else:
-			if function in self.results_cache:
-				logger.debug(f'Removing unwrapped function {function} from cache')
-				del self.results_cache[function]
-			elif wrapped_func in self.results_cache:
-				logger.debug(f'Removing wrapped function {function} from cache')
-				del self.results_cache[wrapped_func]
-			else:
+			if self.results_cache.pop(function, None) is None:
 				raise KeyError(f'Function {function} not in cache')
+			logger.debug('Removed function %s from cache', function)
 
 	def handle_cache_decay(self, function: callable, params: tuple, was_hit: bool) -> None:
 		'''
 		Placeholder for handling cache changes. Subclasses should override this.
+		get_result skips calling it entirely unless a subclass overrides it.
 
 		Args:
 			function (callable): Function called
@@ -126,6 +462,19 @@ class Memoizer:
 
 		pass
 
+	def handle_eviction(self, function: callable, params: tuple) -> None:
+		'''
+		Placeholder for handling results evicted due to maxsize, or another
+			bound such as LRUCache's max_cache_size. Subclasses may override
+			this.
+
+		Args:
+			function (callable): Function whose result was evicted
+			params (tuple): Parameters of the evicted result
+		'''
+
+		pass
+
 	def get_result(self, function: callable, *args, **kwargs) -> Any:
 		'''
 		Gets the result of a function call with specific arguments.
@@ -142,19 +491,38 @@ class Memoizer:
 		Returns:
 			Any: The return value of function.
 		'''
-		if function not in self.results_cache:
-			logger.debug(f'{self}: Adding {function} to cache')
-			self.results_cache[function] = {}
+		return self._get_result(function, self.process_params(args, kwargs), args, kwargs)
 
-		params = self.process_params(args, kwargs)
+	def _get_result(self, function: callable, params: Hashable, args: tuple, kwargs: dict) -> Any:
+		'''
+		Implements get_result once the call parameters have been processed.
 
-		if params not in self.results_cache[function]:
-			self._call_and_add_result(function, *args, **kwargs)
-			self.handle_cache_decay(function, params, was_hit=False)
+		Args:
+			function (callable): The function to run.
+			params (Hashable): The processed parameters, from process_params.
+			args (tuple): Positional arguments. Passed to function.
+			kwargs (dict): Keyword arguments. Passed to function.
+
+		Returns:
+			Any: The return value of function.
+		'''
+		cache = self.results_cache.get(function)
+		if cache is None:
+			logger.debug('%s: Adding %s to cache', self, function)
+			cache = self.results_cache[function] = {} if self.maxsize is None else OrderedDict()
+
+		result = cache.get(params, _MISS)
+		if result is _MISS:
+			result, was_hit = self._call_and_add_result_once(function, params, *args, **kwargs)
 		else:
-			self.handle_cache_decay(function, params, was_hit=True)
+			was_hit = True
+			if self.maxsize is not None:
+				cache.move_to_end(params)
+
+		if self._has_decay_hook:
+			self.handle_cache_decay(function, params, was_hit=was_hit)
 
-		return self.results_cache[function][params]
+		return result
 
 	def memoized(self, function: callable) -> callable:
 		'''
@@ -171,19 +539,78 @@ class Memoizer:
 		Aliases:
 			Memoizer.memo, Memoizer.cache
 		'''
-		logger.debug(f'{self}: Wrapping function {function}')
+		logger.debug('%s: Wrapping function %s', self, function)
+
+		# This deliberately does not delegate to functools.lru_cache, even for
+		# plain hashable args: results must live in results_cache so that
+		# get_result, remove_from_cache and subclass hooks all see them.
+		# Hits that need no bookkeeping are served straight from results_cache,
+		# unless a subclass (e.g. SharedMemoizer) looks results up differently;
+		# everything else goes through _get_result, reusing the same params.
+		# A subclass that overrides the public get_result gets every call.
+		public_get_result = (
+			self.get_result if type(self).get_result is not Memoizer.get_result else None
+		)
+		# results_cache is read per call, so replacing it (e.g. to clear it)
+		# takes effect in existing wrappers too
+		weak_key = isinstance(self.results_cache, weakref.WeakKeyDictionary)
+		# Look weak caches up by a weakref made once, rather than one made per call
+		function_key = weakref.ref(function) if weak_key else function
+		process_params = self.process_params
+		get_result = self._get_result
+		plain_hits = (
+			public_get_result is None
+			and self.maxsize is None
+			and not self._has_decay_hook
+			and type(self)._get_result is Memoizer._get_result
+		)
+		# With the default fast_key processing, hashable args without kwargs
+		# are their own key, so such hits can skip process_params as well.
+		args_are_key = (
+			plain_hits
+			and self.fast_key is True
+			and type(self).process_params is Memoizer.process_params
+		)
 
 		@wraps(function)
 		def get_result_wrapper(*args, **kwargs) -> Any:
 			try:
-				return self.get_result(function, *args, **kwargs)
+				if public_get_result is not None:
+					return public_get_result(function, *args, **kwargs)
+				results_cache = self.results_cache
+				if weak_key:
+					results_cache = results_cache.data
+				if args_are_key and not kwargs:
+					cache = results_cache.get(function_key)
+					try:
+						if cache is None:
+							hash(args)
+							result = _MISS
+						else:
+							result = cache.get(args, _MISS)
+					except TypeError:
+						params = self.make_hashable_func((args, kwargs))
+					else:
+						if result is not _MISS:
+							return result
+						params = args
+					return get_result(function, params, args, kwargs)
+				params = process_params(args, kwargs)
+				if plain_hits:
+					cache = results_cache.get(function_key)
+					if cache is not None:
+						result = cache.get(params, _MISS)
+						if result is not _MISS:
+							return result
+				return get_result(function, params, args, kwargs)
 			except Exception as e:
-				logger.error(f'{self}: Memoization error: {e}')
-				logger.warn(f'Falling back to non-memoized call for {function}')
-				logger.info(f'Args: {args}, kwargs: {kwargs}')
+				logger.error('%s: Memoization error: %s', self, e)
+				logger.warning('Falling back to non-memoized call for %s', function)
+				logger.info('Args: %s, kwargs: %s', args, kwargs)
 				return function(*args, **kwargs)
 
-		logger.debug(f'Wrapped function {get_result_wrapper} created')
+		self._wrapped_funcs[get_result_wrapper] = function
+		logger.debug('Wrapped function %s created', get_result_wrapper)
 		return get_result_wrapper
 	memo = memoized
 	cache = memoized
@@ -1,8 +1,9 @@
 
 import logging
-from collections import deque
+from collections import OrderedDict
 
 from rememo import Memoizer
+from rememo.memoizer import _MISS
 
 logger = logging.getLogger(__name__)
 
@@ -12,25 +13,41 @@ class LRUCache(Memoizer):
 	Memoizer with a basic LRU cache.
 	Attributes:
 		max_cache_size (int): Maximum size of the cache, by item count
-		cache_queue (collections.deque): Queue for tracking LRU cache
+		cache_queue (collections.OrderedDict): (function, params) keys in least-
+			to most-recently used order. Values are unused.
 	'''
 
+	# No __slots__ here: two bases that both add slots cannot be combined, and
+	# LRUCache is meant to be mixed with e.g. TrackingMemoizer. Its attributes
+	# are only read once or twice per call, so slots would save little anyway.
+
 	def __init__(self, max_cache_size: int = 100, **kwargs):
 		self.max_cache_size = max_cache_size
-		self.cache_queue = deque()
-		# TODO: Replace deque with DLL + Hashmap for efficient ops
+		self.cache_queue = OrderedDict()
 
 		super().__init__(**kwargs)
 
 	def handle_cache_decay(self, function: callable, params: tuple, was_hit: bool) -> None:
 		fp = (function, params)
-		if was_hit:
-			self.cache_queue.remove(fp)
-		self.cache_queue.append(fp)
+		queue = self.cache_queue
 
-		if len(self.cache_queue) > self.max_cache_size:
-			old_func, old_params = self.cache_queue.popleft()
-			del self.results_cache[old_func][old_params]
+		if was_hit:
+			# A hit's key is normally already queued, so one move is enough. Only a
+			# miss can grow the queue and need an eviction.
+			try:
+				queue.move_to_end(fp)
+			except KeyError:
+				queue[fp] = None
+		else:
+			# The key may still be queued if its result was removed from the cache
+			queue[fp] = None
+			queue.move_to_end(fp)
+
+			if len(queue) > self.max_cache_size:
+				(old_func, old_params), _ = queue.popitem(last=False)
+				# The result may already be gone, e.g. via remove_from_cache
+				old_cache = self.results_cache.get(old_func)
+				if old_cache is not None and old_cache.pop(old_params, _MISS) is not _MISS:
+					self.handle_eviction(old_func, old_params)
 
 		super().handle_cache_decay(function, params, was_hit)
-
@@ -1,11 +1,16 @@
 
 import logging
+import threading
+import time
 
-from multiprocessing.managers import SyncManager
-from typing import Optional, Tuple, Any
+from multiprocessing.managers import BaseManager
+from typing import Optional, Tuple, Any, Hashable, List
 from functools import wraps
+from collections import OrderedDict
+from contextlib import contextmanager
 
 from rememo import Memoizer
+from rememo.memoizer import _MISS
 
 logger = logging.getLogger(__name__)
 
@@ -20,25 +25,283 @@ def serialize_function(function: callable) -> str:
 	return f'{function.__module__}.{function.__qualname__}'
 
 
+# Methods of a ResultStore that RemoteCaches call through their proxy
+_STORE_METHODS = (
+	'__getitem__',
+	'__setitem__',
+	'__delitem__',
+	'__contains__',
+	'__str__',
+	'get',
+	'add_result',
+	'get_result',
+	'remove_result',
+	'remove_function',
+	'run_batch',
+	'ping',
+)
+
+# ResultStore methods that can be batched with RemoteCache.pipeline
+_BATCH_METHODS = ('add_result', 'get_result', 'remove_result', 'remove_function')
+
+
+class ResultStore(dict):
+	"""
+	The dict of function keys: results hosted by a CacheServer.
+		Adds methods for working with single results in place, so that
+		RemoteCaches need not transfer a function's whole cache per call.
+		Results added with add_result can be bounded across all functions,
+		by count and by age. Either way, the oldest added are dropped first.
+		The manager serves each client connection from its own thread, so
+		every public method holds a lock while it works on the store.
+
+	Attributes:
+		max_results (int, optional): Maximum number of results added with
+			add_result to keep. Defaults to None, meaning unbounded.
+		ttl (float, optional): Seconds after being added that a result
+			expires. Expired results are dropped before any read of the
+			store. Defaults to None, meaning results never expire.
+	"""
+
+	def __init__(self, max_results: Optional[int] = None, ttl: Optional[float] = None):
+		super().__init__()
+		self.max_results = max_results
+		self.ttl = ttl
+		# (function key, params): time added, oldest first. Only kept when bounded.
+		self._added = OrderedDict()
+		self._lock = threading.RLock()
+
+	def _expire(self) -> None:
+		'''
+		Drops the oldest results while there are more than max_results, or
+			while they are older than ttl.
+		'''
+
+		with self._lock:
+			added = self._added
+			expired_before = None if self.ttl is None else time.monotonic() - self.ttl
+			while added:
+				key, added_at = next(iter(added.items()))
+				over_size = self.max_results is not None and len(added) > self.max_results
+				expired = expired_before is not None and added_at <= expired_before
+				if not (over_size or expired):
+					break
+				del added[key]
+				function_key, params = key
+				cache = super().get(function_key)
+				if cache is not None:
+					cache.pop(params, None)
+
+	def _forget_added(self, function_key: str) -> None:
+		'''
+		Stops tracking a function's results for max_results and ttl, once they
+			have been removed or replaced as a whole.
+		'''
+
+		with self._lock:
+			if self._added:
+				for key in [key for key in self._added if key[0] == function_key]:
+					del self._added[key]
+
+	# Reads go through these too, so expired results are never served
+	def __getitem__(self, function_key: str) -> dict:
+		with self._lock:
+			if self.ttl is not None:
+				self._expire()
+			return super().__getitem__(function_key)
+
+	def __contains__(self, function_key: str) -> bool:
+		with self._lock:
+			if self.ttl is not None:
+				self._expire()
+			return super().__contains__(function_key)
+
+	def get(self, function_key: str, default: Any = None) -> Any:
+		with self._lock:
+			if self.ttl is not None:
+				self._expire()
+			return super().get(function_key, default)
+
+	def __setitem__(self, function_key: str, cache: dict) -> None:
+		with self._lock:
+			if super().__contains__(function_key):
+				self._forget_added(function_key)
+			super().__setitem__(function_key, cache)
+
+	def __delitem__(self, function_key: str) -> None:
+		with self._lock:
+			super().__delitem__(function_key)
+			self._forget_added(function_key)
+
+	def add_result(
+			self, function_key: str, params: Hashable, result: Any, maxsize: Optional[int] = None
+	) -> List[Hashable]:
+		'''
+		Adds a single result to a function's cache in place, evicting the oldest
+			results if the cache is larger than maxsize.
+
+		Returns:
+			List[Hashable]: The params of any evicted results
+		'''
+
+		with self._lock:
+			cache = super().get(function_key)
+			if cache is None:
+				cache = self[function_key] = {}
+			cache[params] = result
+
+			evicted = []
+			if maxsize is not None:
+				while len(cache) > maxsize:
+					old_params = next(iter(cache))
+					del cache[old_params]
+					evicted.append(old_params)
+
+			if self.max_results is not None or self.ttl is not None:
+				for old_params in evicted:
+					self._added.pop((function_key, old_params), None)
+				self._added[(function_key, params)] = time.monotonic()
+				self._added.move_to_end((function_key, params))
+				self._expire()
+			return evicted
+
+	def get_result(self, function_key: str, params: Hashable) -> Tuple[bool, Any]:
+		'''
+		Gets a single result from a function's cache.
+
+		Returns:
+			Tuple[bool, Any]: Whether the result was found, and the result
+		'''
+
+		with self._lock:
+			cache = self.get(function_key)
+			if cache is None or params not in cache:
+				return (False, None)
+			return (True, cache[params])
+
+	def remove_result(self, function_key: str, params: Hashable) -> bool:
+		'''
+		Removes a single result from a function's cache.
+
+		Returns:
+			bool: Whether the result was found and removed
+		'''
+
+		with self._lock:
+			self._added.pop((function_key, params), None)
+			cache = self.get(function_key)
+			if cache is None or params not in cache:
+				return False
+			del cache[params]
+			return True
+
+	def remove_function(self, function_key: str) -> bool:
+		'''
+		Removes all of a function's results.
+
+		Returns:
+			bool: Whether the function was found and removed
+		'''
+
+		with self._lock:
+			if self.pop(function_key, None) is None:
+				return False
+			self._forget_added(function_key)
+			return True
+
+	def run_batch(self, calls: List[Tuple[str, tuple]]) -> List[Any]:
+		'''
+		Runs several single-result methods in one call, in order. The store
+			stays locked for the whole batch, so no other client's calls
+			interleave with it. Method names are checked before any call runs.
+
+		Args:
+			calls (List[Tuple[str, tuple]]): (method name, args) pairs. Method
+				names must be in _BATCH_METHODS.
+
+		Returns:
+			List[Any]: The return value of each call
+		'''
+
+		for name, _ in calls:
+			if name not in _BATCH_METHODS:
+				raise ValueError(f'{name} cannot be batched')
+		with self._lock:
+			return [getattr(self, name)(*args) for name, args in calls]
+
+	def ping(self) -> bool:
+		return True
+
+
+class Pipeline:
+	'''
+	Queues single-result operations on a RemoteCache, then sends them to the
+		cache server in a single call. Created by RemoteCache.pipeline.
+
+	Attributes:
+		results (List[Any], optional): The return value of each queued
+			operation, in order, once the pipeline has been executed.
+	'''
+
+	def __init__(self, cache: 'RemoteCache'):
+		self.cache = cache
+		self.calls = []
+		self.results = None
+
+	def add_result(self, key, params, result, maxsize=None) -> None:
+		self.calls.append(('add_result', (key, params, result, maxsize)))
+
+	def get_result(self, key, params) -> None:
+		self.calls.append(('get_result', (key, params)))
+
+	def remove_result(self, key, params) -> None:
+		self.calls.append(('remove_result', (key, params)))
+
+	def remove_function(self, key) -> None:
+		self.calls.append(('remove_function', (key,)))
+
+	def execute(self) -> List[Any]:
+		'''
+		Sends the queued operations to the cache server and clears the queue.
+
+		Returns:
+			List[Any]: The return value of each operation, as the matching
+				RemoteCache method would have returned it
+		'''
+
+		calls = [
+			(name, (self.cache.key_preprocessor(args[0]), *args[1:]))
+			for name, args in self.calls
+		]
+		self.calls = []
+		self.results = self.cache._run_batch(calls)
+		return self.results
+
+
+class CacheManager(BaseManager):
+	'''
+	Manager used by CacheServers and RemoteCaches. Typeids are registered on
+		this subclass, rather than on a multiprocessing manager class shared
+		with the rest of the program.
+	'''
+
+
 class CacheServer:
 	def __init__(
 			self,
 			address: Tuple[str, int] = ('localhost', 50000),
 			authkey: Optional[bytes] = None,
+			max_results: Optional[int] = None,
+			ttl: Optional[float] = None,
 	):
-		self.cache = {}
+		self.cache = ResultStore(max_results=max_results, ttl=ttl)
 		self._connect_or_establish_manager(address, authkey)
 
 	def _connect_or_establish_manager(self, address, authkey):
-		self.manager = SyncManager(address=address, authkey=authkey)
-		self.manager.register('__getitem__', self.cache.__getitem__)
-		self.manager.register('__setitem__', self.cache.__setitem__)
-		self.manager.register('__delitem__', self.cache.__delitem__)
-		self.manager.register('__contains__', self.cache.__contains__)
-		self.manager.register('__reversed__', self.cache.__reversed__)
-		self.manager.register('__iter__', self.cache.__iter__)
-		self.manager.register('__str__', self.cache.__str__)
-		self.manager.register('ping', lambda: True)
+		self.manager = CacheManager(address=address, authkey=authkey)
+		# RemoteCaches hold a single proxy to the store and call its methods
+		# over one persistent connection
+		self.manager.register('store', lambda: self.cache, exposed=_STORE_METHODS)
 		self.manager.start()
 
 
@@ -49,6 +312,8 @@ class RemoteCache:
 		and if unable will host its own then connect to that one. It will also
 		host a new CacheServer in the event it loses connection to the old one
 		and is unable to reconnect.
+		All access goes through a single proxy to the server's ResultStore,
+		which reuses one connection per thread.
 
 	Attributes:
 		key_preprocessor (callable, optional): A method to be called on keys
@@ -58,6 +323,22 @@ class RemoteCache:
 			Defaults to port 50000 on localhost.
 		authkey (bytes, optional): Authentication key for the CacheServer.
 			Defaults to an empty bytestring.
+		read_cache_size (int, optional): How many single results found with
+			get_result to keep locally, in least recently used order, so that
+			repeated lookups skip the server. Local writes and removals
+			update it, but removals made by other processes do not, so this
+			suits caches that are not removed from while shared. For the same
+			reason it cannot be used with result_ttl, or with a server that
+			another process created with a ttl. Defaults to 0, disabling the
+			local cache.
+		max_results (int, optional): Passed to the ResultStore if this
+			RemoteCache creates the CacheServer. Defaults to None.
+		result_ttl (float, optional): Passed to the ResultStore as ttl if this
+			RemoteCache creates the CacheServer. Raises ValueError if set along
+			with read_cache_size. Defaults to None.
+		version (int): Incremented by every change this RemoteCache makes to
+			the server's cache, so that callers holding a copy fetched with
+			__getitem__ or get can tell when it may be out of date.
 
 	Properties:
 		is_host (bool): Whether this RemoteCache is currently acting as the
@@ -68,17 +349,30 @@ class RemoteCache:
 			key_preprocessor: callable = lambda v: v,
 			address: Tuple[str, int] = ('localhost', 50000),
 			authkey: bytes = b'',
+			read_cache_size: int = 0,
+			max_results: Optional[int] = None,
+			result_ttl: Optional[float] = None,
 	):
+		if read_cache_size and result_ttl is not None:
+			# The read cache would keep serving results the server has expired
+			raise ValueError('read_cache_size cannot be used with result_ttl')
 		self.key_preprocessor = key_preprocessor
 		self.address = address
 		self.authkey = authkey
+		self.read_cache_size = read_cache_size
+		self.max_results = max_results
+		self.result_ttl = result_ttl
+		self._read_cache = OrderedDict()
+		self.version = 0
 		self._connect_or_establish_manager(address, authkey)
 
 	def create_server(self, address, authkey):
-		logger.info(f'Establishing cache server at address {address}.')
+		logger.info('Establishing cache server at address %s.', address)
 		self.cache_server = CacheServer(
 			address=address,
 			authkey=authkey,
+			max_results=self.max_results,
+			ttl=self.result_ttl,
 		)
 
 	@property
@@ -86,33 +380,45 @@ class RemoteCache:
 		return hasattr(self, 'cache_server')
 
 	def _connect_or_establish_manager(self, address, authkey):
+		self._drop_connection()
 		try:
 			self._connect(address, authkey)
 		except ConnectionRefusedError as _:
-			logger.warn(f'Failed to connect to cache server at address {address}.')
-			logger.warn(f'Attempting to create new cache server.')
+			logger.warning('Failed to connect to cache server at address %s.', address)
+			logger.warning('Attempting to create new cache server.')
 			self.create_server(address, authkey)
 			self._connect(address, authkey)
 
 	def _connect(self, address, authkey):
-		logger.info(f'Connecting to cache server at address {address}.')
-		self.manager = SyncManager(address=address, authkey=authkey)
-		self.manager.register('__getitem__')
-		self.manager.register('__setitem__')
-		self.manager.register('__delitem__')
-		self.manager.register('__contains__')
-		self.manager.register('__str__')
-		self.manager.register('ping')
+		logger.info('Connecting to cache server at address %s.', address)
+		self.manager = CacheManager(address=address, authkey=authkey)
+		self.manager.register('store', exposed=_STORE_METHODS)
 		self.manager.connect()
+		self.store = self.manager.store()
 		logger.info('Connected.')
 
+	def _drop_connection(self):
+		"""
+		Closes this thread's connection to the cache server, if any.
+		Proxies to the same address share one connection per thread, and
+		multiprocessing does not discard it when the server goes away, so it
+		has to be dropped before reconnecting.
+		"""
+		store = getattr(self, 'store', None)
+		if store is None:
+			return
+		connection = getattr(store._tls, 'connection', None)
+		if connection is not None:
+			del store._tls.connection
+			connection.close()
+
 	def _handle_remote_call(preprocess_key: bool = True):
 		"""
 		Decorator that provides exception handling and key preprocessing for
 		functions called on the cache manager.
 
 		Functions wrapped in this decorator will, upon receiving a
-		ConnectionRefusedError, attempt to reconnect to the cache manager. If
+		ConnectionError or EOFError, attempt to reconnect to the cache manager. If
 		*that* fails, the RemoteCache will attempt to create a new cache
 		manager and connect to that. If that *also* fails, an exception will be
 		raised.
@@ -129,8 +435,8 @@ class RemoteCache:
 					args = (self.key_preprocessor(args[0]), *args[1:])
 				try:
 					return function(self, *args, **kwargs)
-				except ConnectionRefusedError as e:
-					logger.warn(f'Failed to call {function} on cache server: {e}')
+				except (ConnectionError, EOFError) as e:
+					logger.warning('Failed to call %s on cache server: %s', function, e)
 					self._connect_or_establish_manager(self.address, self.authkey)
 					return function(self, *args, **kwargs)
 			return remote_call_wrapper
@@ -138,27 +444,131 @@ class RemoteCache:
 
 	@_handle_remote_call(preprocess_key=True)
 	def __getitem__(self, key):
-		return self.manager[key]._getvalue()
+		return self.store[key]
 
 	@_handle_remote_call(preprocess_key=True)
 	def __setitem__(self, key, value):
-		self.manager[key] = value
+		self.store[key] = value
+		self.version += 1
+		self._forget_function(key)
 
 	@_handle_remote_call(preprocess_key=True)
 	def __delitem__(self, key):
-		del self.manager[key]
+		del self.store[key]
+		self.version += 1
+		self._forget_function(key)
 
 	@_handle_remote_call(preprocess_key=True)
 	def __contains__(self, key):
-		return self.manager.__contains__(key)._getvalue()
+		return key in self.store
+
+	@_handle_remote_call(preprocess_key=True)
+	def get(self, key, default=None):
+		return self.store.get(key, default)
+
+	@_handle_remote_call(preprocess_key=True)
+	def add_result(self, key, params, result, maxsize=None):
+		evicted = self.store.add_result(key, params, result, maxsize)
+		self._added_result(key, params, result, maxsize, evicted)
+		return evicted
+
+	@_handle_remote_call(preprocess_key=True)
+	def get_result(self, key, params):
+		if self.read_cache_size:
+			result = self._read_cache.get((key, params), _MISS)
+			if result is not _MISS:
+				return (True, result)
+		found_result = self.store.get_result(key, params)
+		self._got_result(key, params, found_result)
+		return found_result
+
+	@_handle_remote_call(preprocess_key=True)
+	def remove_result(self, key, params):
+		removed = self.store.remove_result(key, params)
+		self._removed_result(key, params, removed)
+		return removed
+
+	@_handle_remote_call(preprocess_key=True)
+	def remove_function(self, key):
+		removed = self.store.remove_function(key)
+		self._removed_function(key, removed)
+		return removed
+
+	@contextmanager
+	def pipeline(self):
+		'''
+		Context manager that queues add_result, get_result, remove_result and
+			remove_function calls and sends them to the cache server in one
+			round trip on exit.
+			Use it to avoid a round trip per call for known batches of work:
+
+			with cache.pipeline() as pipe:
+				pipe.get_result('func', 1)
+				pipe.get_result('func', 2)
+			found_1, found_2 = pipe.results
+
+		Yields:
+			Pipeline: The pipeline to queue calls on
+		'''
+
+		pipe = Pipeline(self)
+		yield pipe
+		pipe.execute()
+
+	@_handle_remote_call(preprocess_key=False)
+	def _run_batch(self, calls):
+		results = self.store.run_batch(calls)
+		for (name, args), result in zip(calls, results):
+			getattr(self, self._BATCH_HOOKS[name])(*args, result)
+		return results
+
+	# Local bookkeeping after each single-result method, by method name
+	_BATCH_HOOKS = {
+		'add_result': '_added_result',
+		'get_result': '_got_result',
+		'remove_result': '_removed_result',
+		'remove_function': '_removed_function',
+	}
+
+	def _added_result(self, key, params, result, maxsize, evicted):
+		self.version += 1
+		if self.read_cache_size:
+			self._remember(key, params, result)
+			for old_params in evicted:
+				self._read_cache.pop((key, old_params), None)
+
+	def _got_result(self, key, params, found_result):
+		found, result = found_result
+		if found and self.read_cache_size:
+			self._remember(key, params, result)
+
+	def _removed_result(self, key, params, removed):
+		self._read_cache.pop((key, params), None)
+		if removed:
+			self.version += 1
+
+	def _removed_function(self, key, removed):
+		self._forget_function(key)
+		if removed:
+			self.version += 1
+
+	def _remember(self, key, params, result):
+		self._read_cache[(key, params)] = result
+		self._read_cache.move_to_end((key, params))
+		while len(self._read_cache) > self.read_cache_size:
+			self._read_cache.popitem(last=False)
+
+	def _forget_function(self, key):
+		for local_key in [k for k in self._read_cache if k[0] == key]:
+			self._read_cache.pop(local_key, None)
 
 	@_handle_remote_call(preprocess_key=False)
 	def __str__(self):
-		return self.manager.__str__()._getvalue()
+		return self.store.__str__()
 
 	@_handle_remote_call(preprocess_key=False)
 	def ping(self):
-		self.manager.ping()
+		self.store.ping()
 
 
 class SharedMemoizer(Memoizer):
@@ -170,6 +580,11 @@ class SharedMemoizer(Memoizer):
 			This functions (nearly) identically to the results_cache on
 			a standard Memoizer, but is actually a wrapper that allows
 			access to a local or remote cache hosted by a CacheServer.
+			Note that with maxsize set, cache hits do not update the order
+			stored on the server, so eviction is by insertion order.
+			See RemoteCache for read_cache_size, max_results and result_ttl,
+			which are passed through to it. read_cache_size and result_ttl
+			cannot be used together.
 	'''
 
 	def __init__(
@@ -177,29 +592,61 @@ class SharedMemoizer(Memoizer):
 			serialize_function_method: callable = serialize_function,
 			address: Tuple[str, int] = ('localhost', 50000),
 			authkey: bytes = b'',
+			read_cache_size: int = 0,
+			max_results: Optional[int] = None,
+			result_ttl: Optional[float] = None,
 			**kwargs
 	):
 		super().__init__(**kwargs)
 		self.results_cache = RemoteCache(
 			key_preprocessor=serialize_function_method,
 			address=address,
-			authkey=authkey
+			authkey=authkey,
+			read_cache_size=read_cache_size,
+			max_results=max_results,
+			result_ttl=result_ttl,
 		)
 
-	def _call_and_add_result(self, function: callable, *args, **kwargs) -> None:
+	def _cached_result(self, function: callable, params: Hashable) -> Any:
+		'''
+		Looks up a single result on the cache server, without fetching the rest
+			of the function's cache.
+		'''
+
+		found, result = self.results_cache.get_result(function, params)
+		return result if found else _MISS
+
+	def _get_result(self, function: callable, params: Hashable, args: tuple, kwargs: dict) -> Any:
+		'''
+		Implements get_result with a single lookup on the cache server.
+		'''
+
+		result = self._cached_result(function, params)
+		if result is _MISS:
+			result, was_hit = self._call_and_add_result_once(function, params, *args, **kwargs)
+		else:
+			was_hit = True
+
+		if self._has_decay_hook:
+			self.handle_cache_decay(function, params, was_hit=was_hit)
+
+		return result
+
+	def _call_and_add_result(self, function: callable, params: Hashable, *args, **kwargs) -> Any:
 		'''
 		Calls the function and adds it to the cache.
 		Because of how RemoteCaches work, the standard
 		results_cache[function][params] method does not work for SharedMemoizers -
 		specifically, __getitem__ returns a local copy of the cache, and thus mutating
-		values in it does not update them on the remote.
+		values in it does not update them on the remote. Instead, the result is
+		added on the cache server in a single call.
 		'''
 
 		result = function(*args, **kwargs)
-		params = self.process_params(args, kwargs)
-		new_cache = self.results_cache[function]
-		new_cache[params] = result
-		self.results_cache[function] = new_cache
+		evicted = self.results_cache.add_result(function, params, result, self.maxsize)
+		for old_params in evicted:
+			self.handle_eviction(function, old_params)
+		return result
 
 	def remove_from_cache(self, function: callable, *args, **kwargs) -> None:
 		'''
@@ -208,27 +655,13 @@ class SharedMemoizer(Memoizer):
 		RemoteCaches properly
 		'''
 
-		wrapped_func = getattr(function, '__wrapped__', None)
+		function = self._resolve_function(function)
 		if args or kwargs:
 			params = self.process_params(args, kwargs)
-			if function in self.results_cache and params in self.results_cache[function]:
-				logger.debug(f'Removing unwrapped function {function} with params {params} from cache')
-				local = self.results_cache[function]
-				del local[params]
-				self.results_cache[function] = local
-			elif wrapped_func in self.results_cache and params in self.results_cache[wrapped_func]:
-				logger.debug(f'Removing wrapped function {function} with params {params} from cache')
-				local = self.results_cache[wrapped_func]
-				del local[params]
-				self.results_cache[wrapped_func] = local
-			else:
+			if not self.results_cache.remove_result(function, params):
 				raise KeyError(f'Function {function} with params {params} not in cache')
+			logger.debug('Removed function %s with params %s from cache', function, params)
 		else:
-			if function in self.results_cache:
-				logger.debug(f'Removing unwrapped function {function} from cache')
-				del self.results_cache[function]
-			elif wrapped_func in self.results_cache:
-				logger.debug(f'Removing wrapped function {function} from cache')
-				del self.results_cache[wrapped_func]
-			else:
+			if not self.results_cache.remove_function(function):
 				raise KeyError(f'Function {function} not in cache')
+			logger.debug('Removed function %s from cache', function)
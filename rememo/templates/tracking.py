@@ -1,6 +1,7 @@
 
 import logging
 from typing import Optional, Tuple
+from collections import defaultdict
 
 from rememo import Memoizer
 
@@ -17,13 +18,24 @@ class TrackingMemoizer(Memoizer):
 		misses_total (int): Number of cache misses overall
 		hits_by_func (Dict[callable: int]): Number of cache hits per-function
 		misses_by_func (Dict[callable: int]): Number of cache misses per-function
+		evictions_total (int): Number of results evicted due to maxsize, or
+			another bound such as LRUCache's max_cache_size
 	'''
 
+	__slots__ = (
+		'hits_total',
+		'misses_total',
+		'evictions_total',
+		'hits_by_func',
+		'misses_by_func',
+	)
+
 	def __init__(self, **kwargs):
 		self.hits_total = 0
 		self.misses_total = 0
-		self.hits_by_func = {}
-		self.misses_by_func = {}
+		self.evictions_total = 0
+		self.hits_by_func = defaultdict(int)
+		self.misses_by_func = defaultdict(int)
 
 		super().__init__(**kwargs)
 
@@ -37,11 +49,6 @@ class TrackingMemoizer(Memoizer):
 			was_hit (bool): Whether the call was a cache hit
 		'''
 
-		if function not in self.hits_by_func:
-			self.hits_by_func[function] = 0
-		if function not in self.misses_by_func:
-			self.misses_by_func[function] = 0
-
 		if was_hit:
 			self.hits_total += 1
 			self.hits_by_func[function] += 1
@@ -51,13 +58,28 @@ class TrackingMemoizer(Memoizer):
 
 		super().handle_cache_decay(function, params, was_hit)
 
+	def handle_eviction(self, function: callable, params: tuple) -> None:
+		'''
+		Handles results evicted due to a size bound. For TrackingMemoizer, updates
+			the eviction count.
+
+		Args:
+			function (callable): Function whose result was evicted
+			params (tuple): Parameters of the evicted result
+		'''
+
+		self.evictions_total += 1
+
+		super().handle_eviction(function, params)
+
 	def get_hits_misses(self, function: Optional[callable] = None) -> Tuple[int, int]:
 		'''
 		Gets the number of hits and misses, either for a function or in total.
 
 		Args:
 			function (callable, optional):
-				If provided, the function to retrieve the hits and misses for.
+				If provided, the function, or its memoized wrapper, to retrieve
+				the hits and misses for.
 				If omitted, instead retrieves hits and misses overall.
 
 		Returns:
@@ -65,7 +87,8 @@ class TrackingMemoizer(Memoizer):
 		'''
 
 		if function is not None:
-			return (self.hits_by_func[function], self.misses_by_func[function])
+			function = self._resolve_function(function)
+			return (self.hits_by_func.get(function, 0), self.misses_by_func.get(function, 0))
 		else:
 			return (self.hits_total, self.misses_total)
 
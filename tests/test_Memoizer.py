@@ -1,6 +1,10 @@
 
 import unittest
 import logging
+import gc
+import copy
+import pickle
+import threading
 import time
 
 import rememo
@@ -8,6 +12,10 @@ import rememo
 logger = logging.getLogger(__name__)
 
 
+def double(val):
+	return val * 2
+
+
 class TestMemoizer(unittest.TestCase):
 	def setUp(self):
 		self.memoizer = rememo.Memoizer()
@@ -35,6 +43,20 @@ class TestMemoizer(unittest.TestCase):
 			1
 		)
 
+	def test_memoizes_unhashable(self):
+		called_count = 0
+
+		@self.memoizer.memo
+		def testfunc(val):
+			nonlocal called_count
+			called_count += 1
+			return len(val)
+
+		self.assertEqual(testfunc([1, 2]), 2)
+		self.assertEqual(testfunc([1, 2]), 2)
+		self.assertEqual(testfunc((1, 2)), 2)
+		self.assertEqual(called_count, 2)
+
 	def test_in_results_cache(self):
 		@self.memoizer.memo
 		def testfunc(val):
@@ -66,6 +88,62 @@ class TestMemoizer(unittest.TestCase):
 		self.memoizer.get_result(testfunc, 5)
 		self.assertEqual(called_count, 3)
 
+	def test_concurrent_miss(self):
+		called_count = 0
+
+		@self.memoizer.memo
+		def testfunc(val):
+			nonlocal called_count
+			called_count += 1
+			time.sleep(0.2)
+			return val + 2
+
+		threads = [threading.Thread(target=testfunc, args=(1,)) for _ in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(called_count, 1)
+		self.assertEqual(testfunc(1), 3)
+		self.assertEqual(called_count, 1)
+
+	def test_get_result_override(self):
+		calls = []
+
+		class CountingMemoizer(type(self.memoizer)):
+			def get_result(self, function, *args, **kwargs):
+				calls.append(args)
+				return super().get_result(function, *args, **kwargs)
+
+		memoizer = CountingMemoizer()
+
+		@memoizer.memo
+		def testfunc(val):
+			return val
+
+		testfunc(1)
+		testfunc(1)
+		testfunc([1])
+		self.assertEqual(calls, [(1,), (1,), ([1],)])
+
+	def test_kwarg_order(self):
+		self.assertEqual(
+			self.memoizer.process_params((1,), {'a': [1], 'b': 2}),
+			self.memoizer.process_params((1,), {'b': 2, 'a': [1]})
+		)
+
+	def test_kwargs_key_collision(self):
+		@self.memoizer.memo
+		def testfunc(*args, **kwargs):
+			return (args, kwargs)
+
+		self.assertEqual(testfunc(1, a=2), ((1,), {'a': 2}))
+		self.assertEqual(
+			testfunc(1, '<rememo kwargs>', frozenset({('a', 2)})),
+			((1, '<rememo kwargs>', frozenset({('a', 2)})), {})
+		)
+		self.assertEqual(testfunc(1, a=2), ((1,), {'a': 2}))
+
 	def test_cache_removal(self):
 		@self.memoizer.memo
 		def testfunc(v):
@@ -102,4 +180,186 @@ class TestMemoizer(unittest.TestCase):
 			result_3_3
 		)
 
+		# The unwrapped function refers to the same results
+		self.memoizer.remove_from_cache(testfunc.__wrapped__, 3)
+		self.assertNotEqual(result_3_3, testfunc(3))
+		with self.assertRaises(KeyError):
+			self.memoizer.remove_from_cache(testfunc, 4)
+
+
+class TestMemoizerOptions(unittest.TestCase):
+	def test_fast_key(self):
+		hashed = []
+
+		def make_hashable(params):
+			hashed.append(params)
+			return repr(params)
+
+		memoizer = rememo.Memoizer(make_hashable_func=make_hashable)
+		args = (1, 'a')
+		self.assertIs(memoizer.process_params(args, {}), args)
+		self.assertEqual(
+			memoizer.process_params((1,), {'a': 2, 'b': 3}),
+			memoizer.process_params((1,), {'b': 3, 'a': 2})
+		)
+		self.assertEqual(hashed, [])
+
+		memoizer.process_params(([1],), {})
+		memoizer.process_params((1,), {'a': [2]})
+		self.assertEqual(len(hashed), 2)
+
+		memoizer = rememo.Memoizer(make_hashable_func=make_hashable, fast_key=False)
+		memoizer.process_params((1, 'a'), {})
+		self.assertEqual(len(hashed), 3)
+
+	def test_make_hashable(self):
+		self.assertIs(pickle.loads(pickle.dumps(rememo.make_hashable)), rememo.make_hashable)
+		self.assertIs(rememo.hashable_converter(), rememo.make_hashable)
+		self.assertEqual(
+			rememo.make_hashable({'a': [1, 2], 'b': {3}}),
+			rememo.make_hashable({'b': {3}, 'a': [1, 2]})
+		)
+		self.assertEqual(
+			rememo.make_hashable({1: 'a', 'b': 2}),
+			rememo.make_hashable({'b': 2, 1: 'a'})
+		)
+		self.assertNotEqual(
+			rememo.make_hashable([1, 2]),
+			rememo.make_hashable((1, 2))
+		)
+		self.assertEqual(
+			rememo.hashable_converter(repr)([1, object]),
+			(list, (1, repr(object)))
+		)
+
+	def test_maxsize(self):
+		memoizer = rememo.TrackingMemoizer(maxsize=2)
+		called_count = 0
+
+		@memoizer.memo
+		def testfunc(val):
+			nonlocal called_count
+			called_count += 1
+			return val
+
+		testfunc(1)
+		testfunc(2)
+		testfunc(1)
+		testfunc(3)
+		self.assertEqual(memoizer.evictions_total, 1)
+		self.assertEqual(called_count, 3)
+
+		testfunc(1)
+		self.assertEqual(called_count, 3)
+		testfunc(2)
+		self.assertEqual(called_count, 4)
+		self.assertEqual(memoizer.get_hits_misses(testfunc.__wrapped__), (2, 4))
+		self.assertEqual(memoizer.get_hits_misses(testfunc), (2, 4))
+
+		with self.assertRaises(ValueError):
+			rememo.Memoizer(maxsize=-1)
+
+	def test_digest_key(self):
+		memoizer = rememo.Memoizer(make_hashable_func=rememo.digest_hashable)
+		called_count = 0
+
+		@memoizer.memo
+		def testfunc(val):
+			nonlocal called_count
+			called_count += 1
+			return len(val)
+
+		self.assertEqual(testfunc(list(range(10000))), 10000)
+		self.assertEqual(testfunc(list(range(10000))), 10000)
+		self.assertEqual(testfunc(list(range(10001))), 10001)
+		self.assertEqual(called_count, 2)
+		for params in memoizer.results_cache[testfunc.__wrapped__]:
+			self.assertEqual(len(params), 16)
+
+	def test_pickle(self):
+		for memoizer in (
+				rememo.Memoizer(),
+				rememo.Memoizer(weak_functions=True),
+				rememo.TrackingMemoizer(maxsize=2),
+		):
+			memoizer.memo(double)(2)
+			for copied in (pickle.loads(pickle.dumps(memoizer)), copy.deepcopy(memoizer)):
+				self.assertEqual(dict(copied.results_cache), {double: {(2,): 4}})
+				self.assertEqual(copied.memo(double)([1]), [1, 1])
+
+	def test_weak_functions(self):
+		memoizer = rememo.Memoizer(weak_functions=True)
+
+		def testfunc(val):
+			return val
+
+		wrapped = memoizer.memo(testfunc)
+		self.assertEqual(wrapped(1), 1)
+		self.assertEqual(wrapped(1), 1)
+		self.assertEqual(memoizer.results_cache[testfunc], {(1,): 1})
+
+		del testfunc, wrapped
+		gc.collect()
+		self.assertEqual(len(memoizer.results_cache), 0)
+
+		class SlottedCallable:
+			__slots__ = ()
+
+			def __call__(self, val):
+				return val
+
+		with self.assertRaises(TypeError):
+			memoizer.memo(SlottedCallable())
+
+	def test_method_removal(self):
+		called_count = 0
+		memoizer = rememo.Memoizer()
+
+		class TestClass:
+			@memoizer.memo
+			def testmethod(self, val):
+				nonlocal called_count
+				called_count += 1
+				return val
+
+		obj = TestClass()
+		obj.testmethod(1)
+		obj.testmethod(1)
+		self.assertEqual(called_count, 1)
+		memoizer.remove_from_cache(obj.testmethod)
+		obj.testmethod(1)
+		self.assertEqual(called_count, 2)
+
+	def test_unweakrefable_removal(self):
+		class SlottedCallable:
+			__slots__ = ()
+
+			def __call__(self, val):
+				return val
+
+		function = SlottedCallable()
+		memoizer = rememo.TrackingMemoizer()
+		memoized = memoizer.memo(function)
+		memoized(1)
+		memoized(1)
+		self.assertEqual(memoizer.get_hits_misses(function), (1, 1))
+		memoizer.remove_from_cache(function)
+		self.assertNotIn(function, memoizer.results_cache)
+
+	def test_replace_results_cache(self):
+		for weak_functions in (False, True):
+			called_count = 0
+			memoizer = rememo.Memoizer(weak_functions=weak_functions)
+
+			@memoizer.memo
+			def testfunc(val):
+				nonlocal called_count
+				called_count += 1
+				return val
 
+			testfunc(1)
+			testfunc(1)
+			self.assertEqual(called_count, 1)
+			memoizer.results_cache = type(memoizer.results_cache)()
+			testfunc(1)
+			self.assertEqual(called_count, 2)
@@ -0,0 +1,67 @@
+
+import unittest
+import logging
+
+from rememo.templates import LRUCache, TrackingMemoizer
+
+logger = logging.getLogger(__name__)
+
+
+class TestLRUCache(unittest.TestCase):
+	def setUp(self):
+		self.memoizer = LRUCache(max_cache_size=2)
+
+	def tearDown(self):
+		del self.memoizer
+
+	def test_evicts_least_recently_used(self):
+		called_count = 0
+
+		@self.memoizer.memo
+		def testfunc(val):
+			nonlocal called_count
+			called_count += 1
+			return val
+
+		testfunc(1)
+		testfunc(2)
+		testfunc(1)
+		testfunc(3)
+		self.assertEqual(called_count, 3)
+
+		testfunc(1)
+		self.assertEqual(called_count, 3)
+		testfunc(2)
+		self.assertEqual(called_count, 4)
+		self.assertEqual(len(self.memoizer.cache_queue), 2)
+
+	def test_removed_result(self):
+		@self.memoizer.memo
+		def testfunc(val):
+			return val
+
+		testfunc(1)
+		testfunc(2)
+		self.memoizer.remove_from_cache(testfunc, 1)
+		testfunc(3)
+		self.assertEqual(len(self.memoizer.cache_queue), 2)
+
+	def test_with_tracking(self):
+		class TrackedLRU(LRUCache, TrackingMemoizer):
+			pass
+
+		memoizer = TrackedLRU(max_cache_size=2)
+
+		@memoizer.memo
+		def testfunc(val):
+			return val
+
+		testfunc(1)
+		testfunc(2)
+		testfunc(1)
+		testfunc(3)
+		testfunc(2)
+		self.assertEqual(memoizer.get_hits_misses(), (1, 4))
+		self.assertEqual(memoizer.get_hits_misses(testfunc.__wrapped__), (1, 4))
+		self.assertEqual(len(memoizer.cache_queue), 2)
+		self.assertEqual(memoizer.evictions_total, 2)
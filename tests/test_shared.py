@@ -1,16 +1,80 @@
 
 import unittest
 import logging
-import multiprocessing.managers
+import threading
+import time
 
 import rememo
-from rememo.templates.shared import RemoteCache
+from rememo.templates import TrackingMemoizer
+from rememo.templates.shared import RemoteCache, ResultStore
 
 from tests import test_Memoizer
 
 logger = logging.getLogger(__name__)
 
 
+class TestResultStore(unittest.TestCase):
+	def test_max_results(self):
+		store = ResultStore(max_results=2)
+		store.add_result('func', 1, 'a')
+		store.add_result('func2', 1, 'b')
+		store.remove_result('func2', 1)
+		store.add_result('func2', 2, 'c')
+		store.add_result('func', 1, 'd')
+		store.add_result('func', 3, 'e')
+		self.assertEqual(store, {'func': {1: 'd', 3: 'e'}, 'func2': {}})
+
+	def test_max_results_after_removal(self):
+		for remove in (
+				lambda store: store.remove_function('f'),
+				lambda store: store.__delitem__('f'),
+				lambda store: store.__setitem__('f', {}),
+		):
+			store = ResultStore(max_results=2)
+			store.add_result('g', 1, 'a')
+			store.add_result('f', 1, 'b')
+			remove(store)
+			store.add_result('g', 2, 'c')
+			self.assertEqual(store['g'], {1: 'a', 2: 'c'})
+
+	def test_concurrent_add_remove(self):
+		store = ResultStore(max_results=10)
+
+		def churn(function_key):
+			for i in range(1000):
+				store.add_result(function_key, i, i, maxsize=5)
+				store.remove_result(function_key, i - 2)
+
+		threads = [threading.Thread(target=churn, args=(f'f{i}',)) for i in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(
+			sorted(store._added),
+			sorted((key, params) for key, cache in store.items() for params in cache),
+		)
+
+	def test_run_batch(self):
+		store = ResultStore()
+		self.assertEqual(
+			store.run_batch([('add_result', ('f', 1, 'a')), ('get_result', ('f', 1))]),
+			[[], (True, 'a')],
+		)
+		with self.assertRaises(ValueError):
+			store.run_batch([('remove_result', ('f', 1)), ('clear', ())])
+		self.assertEqual(store, {'f': {1: 'a'}})
+
+	def test_ttl(self):
+		store = ResultStore(ttl=0.05)
+		store.add_result('func', 1, 'a')
+		self.assertEqual(store.get_result('func', 1), (True, 'a'))
+		time.sleep(0.1)
+		self.assertEqual(store['func'], {})
+		self.assertEqual(store.get('func'), {})
+		self.assertEqual(store.get_result('func', 1), (False, None))
+
+
 class TestRemoteCache(unittest.TestCase):
 	def test_create(self):
 		cache = RemoteCache()
@@ -31,7 +95,7 @@ class TestRemoteCache(unittest.TestCase):
 		cache = RemoteCache()
 		cache['key'] = 3
 		self.assertEqual(cache['key'], 3)
-		with self.assertRaises(multiprocessing.managers.RemoteError):
+		with self.assertRaises(KeyError):
 			cache['unset_key']
 
 	def test_get_shared(self):
@@ -40,13 +104,62 @@ class TestRemoteCache(unittest.TestCase):
 		cache2 = RemoteCache()
 		self.assertEqual(cache2['key'], 'val')
 
+	def test_single_results(self):
+		cache = RemoteCache()
+		self.assertEqual(cache.get_result('func', 1), (False, None))
+		self.assertEqual(cache.add_result('func', 1, 'a'), [])
+		self.assertEqual(cache.get_result('func', 1), (True, 'a'))
+		self.assertEqual(cache.add_result('func', 2, 'b', 1), [1])
+		self.assertEqual(cache['func'], {2: 'b'})
+		self.assertTrue(cache.remove_result('func', 2))
+		self.assertFalse(cache.remove_result('func', 2))
+		self.assertTrue(cache.remove_function('func'))
+		self.assertFalse(cache.remove_function('func'))
+		self.assertNotIn('func', cache)
+
+	def test_pipeline(self):
+		cache = RemoteCache(read_cache_size=2)
+		with cache.pipeline() as pipe:
+			pipe.add_result('func', 1, 'a')
+			pipe.add_result('func', 2, 'b', 1)
+			pipe.get_result('func', 1)
+			pipe.get_result('func', 2)
+			pipe.remove_result('func', 2)
+		self.assertEqual(pipe.results, [[], [1], (False, None), (True, 'b'), True])
+		self.assertEqual(cache.get_result('func', 2), (False, None))
+		self.assertEqual(cache.version, 3)
+
+	def test_read_cache(self):
+		cache = RemoteCache(read_cache_size=1)
+		cache.add_result('func', 1, 'a')
+		self.assertEqual(cache.get_result('func', 1), (True, 'a'))
+		self.assertIn(('func', 1), cache._read_cache)
+		cache.add_result('func', 2, 'b')
+		self.assertNotIn(('func', 1), cache._read_cache)
+
+		cache.remove_result('func', 2)
+		self.assertEqual(cache.get_result('func', 2), (False, None))
+		cache.add_result('func', 2, 'b')
+		version = cache.version
+		del cache['func']
+		self.assertEqual(cache.get_result('func', 2), (False, None))
+		self.assertEqual(cache.version, version + 1)
+		self.assertFalse(cache.remove_result('func', 2))
+		self.assertEqual(cache.version, version + 1)
+
+	def test_read_cache_ttl_conflict(self):
+		with self.assertRaises(ValueError):
+			RemoteCache(read_cache_size=1, result_ttl=1)
+		with self.assertRaises(ValueError):
+			rememo.SharedMemoizer(read_cache_size=1, result_ttl=1)
+
 	def test_preprocess_key(self):
 		def preprocessor(key):
 			return key[::-1]
 		cache = RemoteCache(key_preprocessor=preprocessor)
 		cache['key'] = 'val'
 		self.assertEqual(cache['key'], 'val')
-		self.assertEqual(cache.manager['yek']._getvalue(), 'val')
+		self.assertEqual(cache.store['yek'], 'val')
 		cache2 = RemoteCache()
 		self.assertEqual(cache2['yek'], 'val')
 
@@ -54,3 +167,32 @@ class TestRemoteCache(unittest.TestCase):
 class TestSharedMemoizer(test_Memoizer.TestMemoizer):
 	def setUp(self):
 		self.memoizer = rememo.SharedMemoizer()
+
+	def test_maxsize(self):
+		class TrackedSharedMemoizer(rememo.SharedMemoizer, TrackingMemoizer):
+			pass
+
+		memoizer = TrackedSharedMemoizer(maxsize=2)
+		called_count = 0
+
+		@memoizer.memo
+		def shared_maxsize_func(val):
+			nonlocal called_count
+			called_count += 1
+			return val
+
+		shared_maxsize_func(1)
+		shared_maxsize_func(2)
+		shared_maxsize_func(1)
+		shared_maxsize_func(3)
+		# Hits do not reorder results on the server, so 1 is evicted first
+		self.assertEqual(memoizer.evictions_total, 1)
+		self.assertEqual(called_count, 3)
+
+		shared_maxsize_func(2)
+		self.assertEqual(called_count, 3)
+		shared_maxsize_func(1)
+		self.assertEqual(called_count, 4)
+		self.assertEqual(memoizer.evictions_total, 2)
+		self.assertEqual(memoizer.get_hits_misses(shared_maxsize_func), (2, 4))
+		self.assertEqual(len(memoizer.results_cache[shared_maxsize_func]), 2)